@@ -1,5 +1,7 @@
 import asyncio
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from io import BytesIO
 import qrcode
@@ -8,8 +10,63 @@ import frappe.defaults
 from frappe.model.document import Document
 from frappe.query_builder import DocType
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from mtl_tims.etims_integration.logger import etims_log
 from mtl_tims.etims_integration.utils import  get_settings
+
+# Seconds to wait for the eTims gateway to accept a connection
+CONNECT_TIMEOUT = 5
+
+# Item fields eTims needs before an item can be registered
+ITEM_REGISTRATION_REQUIRED_FIELDS = (
+    "custom_item_classification",
+    "custom_etims_country_of_origin",
+    "custom_item_classification_level",
+    "custom_packaging_unit",
+    "custom_unit_of_quantity",
+    "custom_eTims_tax_code",
+)
+
+# Shared adapter so repeated eTims calls reuse pooled keep-alive connections.
+# Only failed connection attempts are retried; POSTs that reached the server are not.
+_etims_adapter = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, read=0, status=0, backoff_factor=0.3),
+)
+
+
+def new_etims_session() -> requests.Session:
+    """
+    Create a session on the shared eTims connection pool.
+    Never close these sessions: closing one would clear the pool for all of them.
+    """
+    session = requests.Session()
+    session.headers.update({"Accept": "application/json"})
+    for prefix in ("http://", "https://"):
+        session.mount(prefix, _etims_adapter)
+    return session
+
+
+# Session for calls made on the request's own thread
+etims_session = new_etims_session()
+
+# Sessions are not thread-safe, so post_many's workers each get their own
+_thread_sessions = threading.local()
+
+
+def _get_thread_session() -> requests.Session:
+    session = getattr(_thread_sessions, "session", None)
+    if session is None:
+        session = _thread_sessions.session = new_etims_session()
+    return session
+
+
+def dumps_payload(payload: dict | list) -> bytes:
+    """Serialize a payload to compact UTF-8 JSON for the request body"""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
+
 # --------------------------------------------------------------------------------------#
 #                            ITEM REGISTRATION
 
@@ -68,8 +125,18 @@ def perform_item_registration(item_name: str) -> dict:
     Main synchronous function to register an item or fetch its details from eTIMS.
     Guarantees the database is updated before returning control.
     """
+    return register_item(item_name)
+
+
+def register_item(item_name: str, detail_data: dict | Exception | None = None) -> dict:
+    """
+    Register an item or fetch its details from eTIMS.
+
+    `detail_data` may carry an ItemsDetailV2 response (or the error it raised)
+    that was already fetched by `register_items`, to skip that request.
+    """
     item = frappe.get_doc("Item", item_name)
-    etims_log("Debug", f"Starting eTIMS processing for: {item.name}")
+    etims_log("Debug", "Starting eTIMS processing for:", item.name)
 
     if not is_item_eligible_for_registration(item):
         return {"success": False, "message": "Item not eligible for eTIMS."}
@@ -91,10 +158,13 @@ def perform_item_registration(item_name: str) -> dict:
     detail_url = f"{base_url}/ItemsDetailV2"
 
     try:
-        etims_log("Debug", f"Checking item details via API: {detail_url}")
-        detail_res = requests.post(detail_url, json=detail_payload, headers=headers, timeout=20)
-        detail_res.raise_for_status()
-        detail_data = detail_res.json()
+        if detail_data is None:
+            etims_log("Debug", "Checking item details via API:", detail_url)
+            detail_res = etims_session.post(detail_url, json=detail_payload, headers=headers, timeout=(CONNECT_TIMEOUT, 20))
+            detail_res.raise_for_status()
+            detail_data = detail_res.json()
+        elif isinstance(detail_data, Exception):
+            raise detail_data
         
         # If item already exists on eTIMS server, grab it and skip registration creation loop
         if detail_data.get("status") is True and detail_data.get("responseData"):
@@ -121,12 +191,12 @@ def perform_item_registration(item_name: str) -> dict:
     reg_url = f"{base_url}/AddItemsListV2"
 
     try:
-        etims_log("Debug", f"Sending direct registration payload to: {reg_url}")
-        response = requests.post(reg_url, json=reg_payload, headers=headers, timeout=60)
+        etims_log("Debug", "Sending direct registration payload to:", reg_url)
+        response = etims_session.post(reg_url, json=reg_payload, headers=headers, timeout=(CONNECT_TIMEOUT, 60))
         response.raise_for_status()
         response_data = response.json()
         
-        etims_log("Debug", f"Registration response body: {frappe.as_json(response_data)}")
+        etims_log("Debug", "Registration response body:", response_data)
 
         # Handle Success Case
         if response_data.get("status") is True:
@@ -191,6 +261,72 @@ def perform_item_registration(item_name: str) -> dict:
 
 
 
+def register_items(item_names: list[str], settings_doc) -> None:
+    """Register several items, looking up their eTIMS details concurrently"""
+    if not item_names:
+        return
+
+    api_key = settings_doc.get_password("api_key")
+    base_url = settings_doc.get("etims_url", "").rstrip('/')
+    headers = {"key": api_key, "Content-Type": "application/json"}
+    detail_url = f"{base_url}/ItemsDetailV2"
+
+    items = frappe.get_all(
+        "Item",
+        filters={"name": ["in", item_names]},
+        fields=[
+            "name",
+            "item_code",
+            "disabled",
+            "custom_prevent_etims_registration",
+            *ITEM_REGISTRATION_REQUIRED_FIELDS,
+        ],
+    )
+
+    # Only look up the items register_item would send; it stops at the first one missing fields
+    to_check = []
+    for item in items:
+        if not is_item_eligible_for_registration(item):
+            continue
+        if validate_required_fields(item):
+            break
+        to_check.append(item)
+
+    details = post_many(
+        [(detail_url, build_item_etims_detail_payload(item), headers) for item in to_check],
+        timeout=20,
+    )
+    details_by_item = {item.name: detail_data for item, detail_data in zip(to_check, details)}
+
+    # Database updates stay sequential on the request's own connection
+    for item in items:
+        register_item(item.name, detail_data=details_by_item.get(item.name))
+
+
+def post_many(
+    requests_data: list[tuple[str, dict | list, dict]], timeout: int = 60, max_workers: int = 16
+) -> list[dict | Exception]:
+    """
+    POST several (url, payload, headers) requests concurrently over the shared connection pool.
+    Results come back in request order; a request that fails yields its exception.
+    """
+    if not requests_data:
+        return []
+
+    def _post_one(request_data: tuple[str, dict | list, dict]) -> dict | Exception:
+        url, payload, headers = request_data
+        try:
+            response = _get_thread_session().post(url, json=payload, headers=headers, timeout=(CONNECT_TIMEOUT, timeout))
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(requests_data))) as executor:
+        return list(executor.map(_post_one, requests_data))
+
+
+
 def build_item_etims_detail_payload(item) -> dict:
     """Prepare payload for API call with strict string values"""
     
@@ -245,18 +381,18 @@ def send_to_etimss(payload: dict) -> dict:
 
         headers = {"key": f"{api_key}", "Content-Type": "application/json"}
         
-        etims_log("Debug", f"Sending headers: {headers}")
-        etims_log("Debug", f"Payload being sent: {frappe.as_json(payload)}")
+        etims_log("Debug", "Sending headers:", headers)
+        etims_log("Debug", "Payload being sent:", payload)
 
-        response = requests.post(api_url, json=payload, headers=headers, timeout=60)
+        response = etims_session.post(api_url, json=payload, headers=headers, timeout=(CONNECT_TIMEOUT, 60))
         response.raise_for_status()
         try:
             response_data = response.json()   # Try parse JSON
         except ValueError:
             response_data = response.text     # Fallback to raw text
 
-        etims_log("Debug", f"Response status: {response.status_code}")
-        etims_log("Debug", f"Response body: {frappe.as_json(response_data)}")
+        etims_log("Debug", "Response status:", response.status_code)
+        etims_log("Debug", "Response body:", response_data)
         
         # API-specific success/failure check
         if response_data.get("status") is True:
@@ -274,16 +410,8 @@ def is_item_eligible_for_registration(item) -> bool:
 
 def validate_required_fields(item) -> list:
     """Validate required fields for item registration"""
-    required_fields = [
-        "custom_item_classification",
-        "custom_etims_country_of_origin",
-        "custom_item_classification_level",
-        "custom_packaging_unit",
-        "custom_unit_of_quantity",
-        "custom_eTims_tax_code",
-    ]
     etims_log("Debug", "item registration item", item)
-    return [field for field in required_fields if not item.get(field)]
+    return [field for field in ITEM_REGISTRATION_REQUIRED_FIELDS if not item.get(field)]
 
 # def send_item_to_etims(payload: dict, item_name: str | None = None) -> dict:
 #     """Send the payload to eTims API (runs in background)"""
@@ -393,8 +521,15 @@ def send_payload_to_etims(payload: dict, api_url:str | None = None, api_key:str
     # api_key = settings_doc.get("api_key")#"rVrIW7Yt+h1zB2MUNDJUbQlwqBcaP1vIKK1FDyfe16IF14If/q1vp2qdAVChDa66"
     headers = {"key": api_key, "Content-Type": "application/json"}
 
+    # Serialize up front so a bad payload is not mistaken for a bad eTims response below
     try:
-        response = requests.post(api_url, json=payload, headers=headers, timeout=60)
+        body = dumps_payload(payload)
+    except (TypeError, ValueError) as e:
+        etims_log("Error", f"Could not serialize eTims payload: {str(e)}")
+        return {"status": False, "message": f"Invalid payload: {str(e)}", "responseData": None}
+
+    try:
+        response = etims_session.post(api_url, data=body, headers=headers, timeout=(CONNECT_TIMEOUT, 60))
         response.raise_for_status()
         return response.json()
     except ValueError:
@@ -415,10 +550,10 @@ def send_to_etims(payload: dict,settings: dict | None, doc_name: str | None = No
         api_key = settings_doc.get_password("api_key")
         headers = {"key": api_key, "Content-Type": "application/json"}
         
-        etims_log("Debug", f"Sending headers: {headers}")
-        etims_log("Debug", f"Payload being sent: {frappe.as_json(payload)}")
+        etims_log("Debug", "Sending headers:", headers)
+        etims_log("Debug", "Payload being sent:", payload)
 
-        response = requests.post(api_url, json=payload, headers=headers, timeout=60)
+        response = etims_session.post(api_url, json=payload, headers=headers, timeout=(CONNECT_TIMEOUT, 60))
         response.raise_for_status()
 
         try:
@@ -426,8 +561,8 @@ def send_to_etims(payload: dict,settings: dict | None, doc_name: str | None = No
         except ValueError:
             response_data = {"status": False, "message": response.text, "responseData": []}
 
-        etims_log("Debug", f"Response status: {response.status_code}")
-        etims_log("Debug", f"Response body: {frappe.as_json(response_data)}")
+        etims_log("Debug", "Response status:", response.status_code)
+        etims_log("Debug", "Response body:", response_data)
 
         # Handle success
         if response_data.get("status") is True:
@@ -595,11 +730,12 @@ def submit_all(doctype: str = None) -> None:
 
     etims_log("Debug", "submit_all items", items)
 
+    if doctype == "Item":
+        register_items([item["name"] for item in items], settings)
+        return
+
     for item in items:
-        if doctype == "Item":
-            perform_item_registration(item["name"])
-        else:
-            send_branch_customer_details(item["name"], settings, True)
+        send_branch_customer_details(item["name"], settings, True)
 
 # --------------------------------------------------------------------------------------#
 #                            BULK CUSTOMER REGISTRATION
@@ -0,0 +1,67 @@
+# Copyright (c) 2025, MTSL and Contributors
+# See license.txt
+
+import json
+import time
+from unittest.mock import patch
+
+import requests
+from frappe.tests.utils import FrappeTestCase
+
+from mtl_tims.etims_integration.apis import apis
+
+BASE_URL = "http://etims.test/api"
+
+
+def _fake_send(request, **kwargs):
+	"""Echo the posted payload back, after the delay it asks for"""
+	if request.url.endswith("/fail"):
+		raise requests.ConnectionError("eTims unreachable")
+
+	payload = json.loads(request.body)
+	time.sleep(payload.get("delay", 0))
+
+	response = requests.Response()
+	response.status_code = 200
+	response._content = json.dumps(payload).encode("utf-8")
+	response.request = request
+	response.url = request.url
+	return response
+
+
+class TestPostMany(FrappeTestCase):
+	def test_results_follow_request_order(self):
+		# Earlier requests take longer, so they finish last
+		requests_data = [
+			(f"{BASE_URL}/ItemsDetailV2", {"index": i, "delay": (4 - i) * 0.05}, {}) for i in range(5)
+		]
+
+		with patch.object(apis._etims_adapter, "send", side_effect=_fake_send):
+			results = apis.post_many(requests_data, max_workers=5)
+
+		self.assertEqual([result["index"] for result in results], list(range(5)))
+
+	def test_failed_request_yields_its_exception(self):
+		requests_data = [
+			(f"{BASE_URL}/ItemsDetailV2", {"index": 0}, {}),
+			(f"{BASE_URL}/fail", {"index": 1}, {}),
+			(f"{BASE_URL}/ItemsDetailV2", {"index": 2}, {}),
+		]
+
+		with patch.object(apis._etims_adapter, "send", side_effect=_fake_send):
+			results = apis.post_many(requests_data)
+
+		self.assertEqual(results[0]["index"], 0)
+		self.assertIsInstance(results[1], requests.ConnectionError)
+		self.assertEqual(results[2]["index"], 2)
+
+	def test_workers_do_not_use_the_module_session(self):
+		requests_data = [(f"{BASE_URL}/ItemsDetailV2", {"index": i}, {}) for i in range(3)]
+
+		with (
+			patch.object(apis._etims_adapter, "send", side_effect=_fake_send),
+			patch.object(apis.etims_session, "post", side_effect=AssertionError("shared session used")),
+		):
+			results = apis.post_many(requests_data)
+
+		self.assertEqual([result["index"] for result in results], [0, 1, 2])
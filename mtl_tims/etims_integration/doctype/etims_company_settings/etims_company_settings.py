@@ -4,6 +4,12 @@
 # import frappe
 from frappe.model.document import Document
 
+from mtl_tims.etims_integration.utils import clear_etims_active_cache
+
 
 class eTimsCompanySettings(Document):
-	pass
+	def on_update(self):
+		clear_etims_active_cache()
+
+	def on_trash(self):
+		clear_etims_active_cache()
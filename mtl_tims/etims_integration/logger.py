@@ -15,6 +15,14 @@ logger.set_log_level("DEBUG")
 etims_logger = frappe.logger("etims", allow_site=True, file_count=50)
 
 
+def is_etims_debug_enabled() -> bool:
+    """
+    Check whether verbose eTims logging is switched on for the current site.
+    Set `"etims_debug": 1` in site_config.json to enable it.
+    """
+    return bool(frappe.conf.get("etims_debug"))
+
+
 # @frappe.whitelist()
 # def etims_log(level: str, *args, **kwargs):
 #     """
@@ -42,6 +50,11 @@ def etims_log(level: str, *args, **kwargs):
         etims_log("error", "before_save_", doc)
         etims_log("error", ["msg1", "msg2"])  # if coming from frappe.call
     """
+    # Debug output is opt-in per site; skip building the message when it is off
+    level = level.lower()
+    if level not in ("error", "warning") and not is_etims_debug_enabled():
+        return
+
     # Handle case where Frappe sends args as a list (from JS)
     if len(args) == 1 and isinstance(args[0], (list, tuple)):
         args = args[0]
@@ -50,7 +63,6 @@ def etims_log(level: str, *args, **kwargs):
     message = " ".join(str(a) for a in args) if args else ""
 
     # Route to appropriate log level
-    level = level.lower()
     if level == "error":
         etims_logger.error(message, **kwargs)
     elif level == "warning":
@@ -3,11 +3,11 @@ from frappe import _
 from frappe.model.document import Document
 
 from ...apis.apis import send_branch_customer_details
-from ...utils import get_settings
+from ...utils import get_default_company, get_settings
 from ...logger import etims_log
 
 def on_update(doc: Document, method: str = None) -> None:
-    company_name = frappe.defaults.get_user_default("Company") or frappe.get_value("Company", {}, "name")
+    company_name = get_default_company()
 
     etims_log("Debug", "on_update company", company_name)
     settings = get_settings(company_name=company_name)
@@ -6,7 +6,7 @@ from frappe.model.document import Document
 from ...apis.apis import perform_item_registration
 from ...doctype.doctype_names_mapping import SETTINGS_DOCTYPE_NAME
 from ...utils import  get_settings
-from ...logger import etims_log
+from ...logger import etims_log, is_etims_debug_enabled
 
 def on_update(doc: Document, method: str = None) -> None:
     """Item doctype before insertion hook"""
@@ -29,7 +29,8 @@ def on_update(doc: Document, method: str = None) -> None:
 
 def prevent_item_deletion(doc, method=None):
     settings_doc = get_settings()
-    etims_log("Debug", "prevent_item_deletion", doc.as_dict())
+    if is_etims_debug_enabled():
+        etims_log("Debug", "prevent_item_deletion", doc.as_dict())
 
     if not settings_doc:
         return
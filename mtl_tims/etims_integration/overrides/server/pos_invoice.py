@@ -14,5 +14,7 @@ def before_submit(doc: Document, method: str) -> None:
 
     if not settings_doc:
         return
+    # Submit never runs before_save, so drop any calculation from an earlier save of this instance
+    doc.flags.etims_tax_calculated = False
     if not doc.custom_successfully_submitted:
         generic_invoices_before_submit(doc, settings_doc,"POS Invoice")
@@ -5,9 +5,8 @@ from erpnext.controllers.taxes_and_totals import get_itemised_tax_breakup_data
 
 from ...apis.apis import send_payload_to_etims
 
-from ...utils import get_settings
-from frappe.utils import now_datetime
-from ...logger import etims_log
+from ...utils import get_etims_item_details, get_settings, get_submission_dates
+from ...logger import etims_log, is_etims_debug_enabled
 
 
 def validate(doc: Document, method: str = None) -> None:
@@ -73,16 +72,18 @@ def submit_purchase_invoice(doc: Document,settings_doc: dict | None) -> None:
             doc.custom_purchase_invoice_eTims_message = response.get("message")
             doc.custom_eTims_response = frappe.as_json(response)
 
-            etims_log("Debug", "Parent Invoice updated fields", doc.as_dict())
+            if is_etims_debug_enabled():
+                etims_log("Debug", "Parent Invoice updated fields", doc.as_dict())
     
     
             # --- Update Purchase Invoice Items (Child Table) ---
             etims_log("Debug", "Item Responses Empty - Populating from Item master")
-            etims_log("Debug", f"Items count: {len(doc.items)}")
+            etims_log("Debug", "Items count:", len(doc.items))
 
             for i, item in enumerate(doc.items):
                 etims_log("Debug", f"Updating Item {i}: {item.item_code}")
-                etims_log("Debug", f"Updating Item before {i}: {item.as_dict()}")
+                if is_etims_debug_enabled():
+                    etims_log("Debug", f"Updating Item before {i}: {item.as_dict()}")
 
                 # Fetch from Item master
                 item_doc = frappe.get_doc("Item", item.item_code)
@@ -99,7 +100,8 @@ def submit_purchase_invoice(doc: Document,settings_doc: dict | None) -> None:
                 item.taxation_type_code = item_doc.get("custom_eTims_tax_code")
 
                 # Log update
-                etims_log("Debug", f"Item {i} updated fields", item.as_dict())
+                if is_etims_debug_enabled():
+                    etims_log("Debug", f"Item {i} updated fields", item.as_dict())
             
             # --- Save and commit ---
             # doc.save(ignore_permissions=True)
@@ -114,9 +116,7 @@ def submit_purchase_invoice(doc: Document,settings_doc: dict | None) -> None:
 
 
 def build_purchase_invoice_payload(doc: Document) -> dict:
-    dt = now_datetime()
-    date_only = dt.strftime("%Y%m%d")
-    date_time = f"{date_only}120000"
+    date_only, date_time = get_submission_dates()
 
     payload = {
         "supplierTin": doc.tax_id or "",
@@ -135,9 +135,11 @@ def build_purchase_invoice_payload(doc: Document) -> dict:
         "itemsDataList": []
     }
 
+    etims_items = get_etims_item_details({item.item_code for item in doc.items})
+
     for item in doc.items:
-        item_doc = frappe.get_doc("Item", item.item_code)
-        tax_code = item_doc.custom_eTims_tax_code or ""
+        row = etims_items.get(item.item_code)
+        tax_code = (row and row.custom_eTims_tax_code) or ""
         if not tax_code:
             frappe.throw(
                 msg=f"Item {item.item_name} does not have a valid eTims Tax Code. Please update the item before submitting the invoice.",
@@ -161,7 +163,7 @@ def build_purchase_invoice_payload(doc: Document) -> dict:
             "itemExprDate": ""
         })
 
-    etims_log("Debug", "build_invoice_payload payload", frappe.as_json(payload))
+    etims_log("Debug", "build_invoice_payload payload", payload)
     return payload
 
 
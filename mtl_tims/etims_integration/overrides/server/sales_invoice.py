@@ -3,7 +3,7 @@ from frappe.model.document import Document
 
 from .shared_overrides import generic_invoices_before_submit
 from ...utils import calculate_tax, get_settings
-from ...logger import etims_log
+from ...logger import etims_log, is_etims_debug_enabled
 
 def before_submit(doc: Document, method: str = None) -> None:
     """Check if company setting is active and items are eTims registered before submit."""
@@ -27,6 +27,8 @@ def before_submit(doc: Document, method: str = None) -> None:
                 f"Item {item.item_name} is not registered in eTims. Invoice cannot be submitted."
             )
 
+    # Submit never runs before_save, so drop any calculation from an earlier save of this instance
+    doc.flags.etims_tax_calculated = False
     calculate_tax(doc)
 
     # Submit to eTims only if conditions are satisfied and integration is active
@@ -42,7 +44,8 @@ def before_submit(doc: Document, method: str = None) -> None:
 def before_cancel(doc: Document, method: str = None) -> None: 
     """Disallow cancelling of submitted invoice to eTIMS."""
 
-    etims_log("Debug", "before_cancel", doc.as_dict())
+    if is_etims_debug_enabled():
+        etims_log("Debug", "before_cancel", doc.as_dict())
 
     if doc.doctype == "Sales Invoice" and doc.custom_successfully_submitted:
         frappe.throw(
@@ -10,7 +10,7 @@ import qrcode
 from ...apis.apis import send_payload_to_etims
 
 from ...utils import build_invoice_payload,build_creditnote_payload, get_invoice_reference_number
-from ...logger import etims_log
+from ...logger import etims_log, is_etims_debug_enabled
 from typing import Literal
 
 
@@ -29,13 +29,18 @@ def generic_invoices_before_submit(
     
     # --- Process Returns ---
     if doc.is_return:
-        return_invoice = frappe.get_doc(invoice_type, doc.return_against)
-        if not return_invoice.custom_successfully_submitted:
+        return_invoice = frappe.db.get_value(
+            invoice_type,
+            doc.return_against,
+            ["custom_successfully_submitted", "custom_scu_invoice_number"],
+            as_dict=True,
+        ) or {}
+        if not return_invoice.get("custom_successfully_submitted"):
             frappe.throw(
                 f"Return against invoice {doc.return_against} was not successfully submitted. Cannot process return."
             )
 
-        reference_number = return_invoice.custom_scu_invoice_number
+        reference_number = return_invoice.get("custom_scu_invoice_number")
         payload = build_creditnote_payload(doc,invoice_type, reference_number)
 
         etims_log("Debug", "generic_invoices_before_submit creditnote payload", payload)
@@ -107,16 +112,18 @@ def handle_etims_success_response(doc, response: dict, doctype: str):
     doc.custom_eTims_response = frappe.as_json(response)
     doc.custom_scu_id = resp.get("sdcid")
     doc.custom_scu_mrc_no = resp.get("sdcmrcNo")
-    etims_log("Debug", "Parent Invoice updated fields", doc.as_dict())
+    if is_etims_debug_enabled():
+        etims_log("Debug", "Parent Invoice updated fields", doc.as_dict())
     
     
     # --- Update Sales Invoice Items (Child Table) ---
     etims_log("Debug", "Item Responses Empty - Populating from Item master")
-    etims_log("Debug", f"Items count: {len(doc.items)}")
+    etims_log("Debug", "Items count:", len(doc.items))
 
     for i, item in enumerate(doc.items):
         etims_log("Debug", f"Updating Item {i}: {item.item_code}")
-        etims_log("Debug", f"Updating Item before {i}: {item.as_dict()}")
+        if is_etims_debug_enabled():
+            etims_log("Debug", f"Updating Item before {i}: {item.as_dict()}")
 
         # Fetch from Item master
         item_doc = frappe.get_doc("Item", item.item_code)
@@ -133,7 +140,8 @@ def handle_etims_success_response(doc, response: dict, doctype: str):
         item.taxation_type_code = item_doc.get("custom_eTims_tax_code")
 
         # Log update
-        etims_log("Debug", f"Item {i} updated fields", item.as_dict())
+        if is_etims_debug_enabled():
+            etims_log("Debug", f"Item {i} updated fields", item.as_dict())
     # --- Save and commit ---
     # doc.save(ignore_permissions=True)
     # frappe.db.commit()
@@ -155,9 +163,6 @@ def generate_and_attach_qr_code(url: str, docname: str, doctype: str) -> str:
     buffer = BytesIO()
     img.save(buffer, format="PNG")
 
-    # Always reset pointer
-    buffer.seek(0)
-
     # Remove old QR if it exists
     existing_files = frappe.get_all(
         "File",
@@ -174,7 +179,7 @@ def generate_and_attach_qr_code(url: str, docname: str, doctype: str) -> str:
         "is_private": 0,
         "attached_to_doctype": doctype,
         "attached_to_name": docname,
-        "content": buffer.getvalue(),   # ✅ use getvalue()
+        "content": buffer.getvalue(),  # getvalue() reads the whole buffer regardless of position
     })
     file_doc.save(ignore_permissions=True)
 
@@ -1,7 +1,7 @@
 import frappe
 from frappe.model.document import Document
 from erpnext.controllers.taxes_and_totals import get_itemised_tax_breakup_data
-from ...apis.apis import send_payload_to_etims
+from ...apis.apis import perform_item_registration, send_payload_to_etims
 from ...utils import get_settings
 from frappe.utils import now_datetime
 from ...logger import etims_log
@@ -47,8 +47,6 @@ def submit_stock_reconciliation(doc: Document, settings_doc: dict | None) -> Non
         
         # Ensure item is eTims registered
         if not custom_item_code:
-            from ...apis.apis import perform_item_registration
-            
             # Trigger item registration (Ensure this function performs a database commit/save natively)
             perform_item_registration(item.item_code)
 
@@ -108,5 +106,5 @@ def build_stock_reconciliation_payload(doc: Document) -> dict:
             "quantity": qty
         })
 
-    etims_log("Debug", "submit_stock_reconciliation payload", frappe.as_json(payload))
+    etims_log("Debug", "submit_stock_reconciliation payload", payload)
     return payload
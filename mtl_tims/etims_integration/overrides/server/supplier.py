@@ -2,18 +2,18 @@ import frappe
 from frappe.model.document import Document
 
 from ...apis.apis import send_branch_customer_details
-from ...utils import get_active_settings
+from ...utils import get_active_settings, get_default_company, get_settings
 
 
 def on_update(doc: Document, method: str = None) -> None:
-    active_settings = get_active_settings()
+    active_settings = get_active_settings(get_default_company())
     if not active_settings:
         return
         
-    # Submit to eTims only if conditions are satisfied and integration is active
+    # Submit to eTims only if conditions are satisfied; only active integrations are returned above
     if (
         doc.custom_details_submitted_successfully == 0
         and doc.custom_prevent_etims_registration == 0
-        and settings_doc.get("is_active") == 1   # eTims Integration isActive
     ):
-        send_branch_customer_details(doc.name, active_settings, False)
+        settings_doc = get_settings(active_settings[0].company_name)
+        send_branch_customer_details(doc.name, settings_doc, False)
@@ -0,0 +1,106 @@
+# Copyright (c) 2025, MTSL and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from mtl_tims.etims_integration import utils
+from mtl_tims.etims_integration.overrides.server import sales_invoice
+
+
+def _make_item(item_code: str, base_net_amount: float, qty: float = 1) -> frappe._dict:
+	return frappe._dict(
+		item_code=item_code,
+		item_name=item_code,
+		item_tax_template=None,
+		qty=qty,
+		base_net_amount=base_net_amount,
+		base_net_rate=base_net_amount / qty,
+	)
+
+
+class _TestInvoice:
+	"""Minimal stand-in for an invoice Document (a frappe._dict would shadow `items`)"""
+
+	def __init__(self, **fields):
+		self.__dict__.update(fields)
+		self.flags = frappe._dict()
+
+	def get(self, key, default=None):
+		return getattr(self, key, default)
+
+
+def _make_invoice(items: list, tax_amount: float) -> _TestInvoice:
+	return _TestInvoice(
+		name="SINV-TEST-0001",
+		customer="_Test Customer",
+		tax_id=None,
+		is_pos=0,
+		custom_successfully_submitted=1,
+		items=items,
+		taxes=[frappe._dict(tax_amount=tax_amount)],
+	)
+
+
+def _item_details(item_codes: set[str]) -> dict[str, dict]:
+	return {
+		item_code: frappe._dict(name=item_code, custom_item_code_etims=f"KE{item_code}", custom_eTims_tax_code="B")
+		for item_code in item_codes
+	}
+
+
+class TestTaxCalculationMemo(FrappeTestCase):
+	def setUp(self):
+		patches = [
+			patch.object(utils, "is_etims_active", return_value=True),
+			patch.object(utils, "get_etims_item_details", side_effect=_item_details),
+		]
+		self.item_details = [p.start() for p in patches][1]
+		for p in patches:
+			self.addCleanup(p.stop)
+
+	def test_before_save_recalculates_on_every_save(self):
+		doc = _make_invoice([_make_item("ITEM-A", 100)], tax_amount=16)
+
+		utils.before_save_(doc)
+		self.assertAlmostEqual(doc.items[0].custom_tax_amount, 16)
+
+		doc.taxes[0].tax_amount = 8
+		utils.before_save_(doc)
+
+		self.assertAlmostEqual(doc.items[0].custom_tax_amount, 8)
+		self.assertEqual(self.item_details.call_count, 2)
+
+	def test_before_submit_recalculates_after_items_change(self):
+		doc = _make_invoice([_make_item("ITEM-A", 100)], tax_amount=16)
+		utils.before_save_(doc)
+
+		# Edited on the same instance after saving, then submitted without another save
+		doc.items.append(_make_item("ITEM-B", 100))
+		doc.taxes[0].tax_amount = 32
+
+		with (
+			patch.object(sales_invoice, "get_settings", return_value=frappe._dict(is_active=0)),
+			patch("frappe.get_doc", side_effect=lambda doctype, name: frappe._dict(name=name, custom_item_code_etims="KE1")),
+		):
+			sales_invoice.before_submit(doc)
+
+		self.assertEqual(self.item_details.call_count, 2)
+		for item in doc.items:
+			self.assertAlmostEqual(item.custom_tax_amount, 16)
+			self.assertEqual(item.taxation_type_code, "B")
+
+	def test_payload_builders_reuse_the_calculation(self):
+		doc = _make_invoice([_make_item("ITEM-A", 100, qty=2)], tax_amount=16)
+		utils.calculate_tax(doc)
+
+		with patch("frappe.get_value", return_value={}):
+			sale_payload = utils.build_invoice_payload(doc, "Sales Invoice")
+			credit_note_payload = utils.build_creditnote_payload(doc, "Sales Invoice", "1")
+
+		self.assertEqual(self.item_details.call_count, 1)
+		self.assertEqual(sale_payload["saleItemList"][0]["taxTypeCode"], "B")
+		self.assertEqual(sale_payload["saleItemList"][0]["unitPrice"], 58)
+		self.assertEqual(credit_note_payload["creditNoteItemsList"][0]["unitPrice"], 42)
@@ -1,31 +1,23 @@
 """Utility functions"""
 
-import json
 import re
-import secrets
-import string
-from base64 import b64encode
-from datetime import datetime, timedelta
-from decimal import ROUND_DOWN, Decimal
-from io import BytesIO
-from typing import Any, Dict, List, Union, Literal
-from urllib.parse import urlencode
-
-import qrcode
-import requests
+from typing import Any, Literal
 
 import frappe
-from frappe import _
-from frappe.integrations.utils import create_request_log
 from frappe.model.document import Document
-from frappe.query_builder import DocType
 from frappe.utils import now_datetime
+from frappe.utils.caching import request_cache
 
 from .doctype.doctype_names_mapping import (
     SETTINGS_DOCTYPE_NAME,
 )
 from .logger import etims_log
 
+_KRA_PIN_RE = re.compile(r"^[A-Za-z][0-9]{9}[A-Za-z]$")
+
+# Settings exposed to the client; credentials and endpoints stay server-side
+SETTINGS_FIELDS = ("name", "company_name", "tin", "env", "is_active")
+
 
 def is_valid_kra_pin(pin: str) -> bool:
     """Checks if the string provided conforms to the pattern of a KRA PIN.
@@ -38,18 +30,19 @@ def is_valid_kra_pin(pin: str) -> bool:
     Returns:
         bool: True if input is a valid KRA PIN, False otherwise
     """
-    pattern = r"^[a-zA-Z]{1}[0-9]{9}[a-zA-Z]{1}$"
-    return bool(re.match(pattern, pin))
+    return len(pin) == 11 and _KRA_PIN_RE.match(pin) is not None
+
+
+@request_cache
+def get_default_company() -> str | None:
+    """Return the user's default company, falling back to the first available one."""
+    return frappe.defaults.get_user_default("Company") or frappe.get_value("Company", {}, "name")
 
 
 def get_settings(company_name: str = None):
     """Fetch active settings document for a given company."""
 
-    company_name = (
-        company_name
-        or frappe.defaults.get_user_default("Company")
-        or frappe.get_value("Company", {}, "name")
-    )
+    company_name = company_name or get_default_company()
 
     if not company_name:
         return None
@@ -63,7 +56,8 @@ def get_settings(company_name: str = None):
     if not settings_name:
         return None
 
-    return frappe.get_doc(SETTINGS_DOCTYPE_NAME, settings_name)
+    # Callers only read settings; the cached doc is invalidated whenever it is saved
+    return frappe.get_cached_doc(SETTINGS_DOCTYPE_NAME, settings_name)
 
 # def get_settings(company_name: str = None) -> dict | None:
 #     """Fetch active settings for a given company.
@@ -91,23 +85,28 @@ def get_settings(company_name: str = None):
 #     )
 
 
-        
+def get_active_settings(company_name: str = None) -> list[dict]:
+    """Return the active eTims settings records, optionally for a single company"""
+    filters = {"is_active": 1}
+    if company_name:
+        filters["company_name"] = company_name
+
+    return frappe.get_all(
+        SETTINGS_DOCTYPE_NAME,
+        filters=filters,
+        fields=["name", "company_name"],
+        order_by="modified desc",
+        limit=20,
+        ignore_permissions=True,
+    )
+
 
-# @frappe.whitelist()
-# def get_active_settings(doctype: str = SETTINGS_DOCTYPE_NAME,company_name: str = None) -> list[dict]:
-#     try:
-#         results = frappe.get_all(
-#             doctype,
-#             filters={"is_active": 1},
-#             fields=["name", "company"],
-#             ignore_permissions=True  
-#         )
-#         return results
-#     except Exception as e:
-#         frappe.log_error(frappe.get_traceback(), _("Failed to get active settings"))
-#         frappe.throw(_("An error occurred while fetching settings"))
 
 
+def get_submission_dates() -> tuple[str, str]:
+    """Return today's server date as eTims expects it: (YYYYMMDD, YYYYMMDD120000)"""
+    date_only = now_datetime().strftime("%Y%m%d")
+    return date_only, f"{date_only}120000"
 
 
 """
@@ -123,9 +122,7 @@ def build_invoice_payload(
     # Fetch the fields as a dictionary using frappe.get_value
     cust_data = frappe.get_value("Customer", invoice.customer, ["number", "customer_name", "tax_id"], as_dict=True) or {}
     etims_log("Debug","cust_data",cust_data)
-    dt = now_datetime()
-    dateOnly = dt.strftime("%Y%m%d")
-    dateTime = f"{dateOnly}120000"
+    dateOnly, dateTime = get_submission_dates()
     payload = {
         "customerNo": cust_data.get("number") or None,
         "customerTin": invoice.tax_id or cust_data.get("tax_id"), 
@@ -148,36 +145,49 @@ def build_invoice_payload(
     
     etims_log("Debug", "build_invoice_payload payload reference_number", reference_number,payload)
     calculate_tax(invoice)
-    
-    for item in invoice.items:
-        tax_amount = item.get("custom_tax_amount", 0) or 0
-        qty = abs(item.get("qty"))
-        base_net_rate = round(item.get("base_net_rate") or 0, 4)
-        etims_log("Debug", "build_invoice_payload tax_code item", tax_amount,qty,base_net_rate,item)
-        # tax_code = item.get("taxation_type_code", "A") or "A"
-        item_doc = frappe.get_doc("Item", item.item_code)
-        tax_code = item_doc.custom_eTims_tax_code or ""
-        if not tax_code:
-            frappe.throw(
-                msg=f"Item {item.item_name} does not have a valid eTims Tax Code. Please update the item before submitting the invoice.",
-                title="eTims Error"
-            )
-
-        etims_log("Debug", "build_invoice_payload tax_code item", tax_code,item)
-        payload["saleItemList"].append({
-            "itemCode": item.item_code,
-            "taxTypeCode": tax_code,
-            "unitPrice": round(base_net_rate + (tax_amount / qty if qty else 0), 4),
-            "pkgQuantity": qty,
-            "quantity": qty,
-            # "uom": item.uom or "Pcs",
-            "discountRate": 0,
-            "discountAmt": 0
-        })
+
+    # Reuse the Item rows calculate_tax fetched for this document
+    etims_items = invoice.flags.etims_item_details
+
+    payload["saleItemList"] = [_build_sale_item(item, etims_items) for item in invoice.items]
+    etims_log("Debug", "build_invoice_payload saleItemList", payload["saleItemList"])
 
     # etims_log("Debug", "build_invoice_payload payload", payload)
     return payload
 
+
+def _build_sale_item(item, etims_items: dict[str, dict]) -> dict:
+    """Build a saleItemList entry, requiring the item to have an eTims tax code"""
+    tax_code = _get_taxation_type_from_item(item, etims_items)
+    if not tax_code:
+        frappe.throw(
+            msg=f"Item {item.item_name} does not have a valid eTims Tax Code. Please update the item before submitting the invoice.",
+            title="eTims Error"
+        )
+
+    qty, unit_price = _get_line_values(item, tax_sign=1)
+    return {
+        "itemCode": item.item_code,
+        "taxTypeCode": tax_code,
+        "unitPrice": unit_price,
+        "pkgQuantity": qty,
+        "quantity": qty,
+        # "uom": item.uom or "Pcs",
+        "discountRate": 0,
+        "discountAmt": 0
+    }
+
+
+def _get_line_values(item, tax_sign: int) -> tuple[float, float]:
+    """
+    Return the absolute quantity and the unit price of an invoice line.
+    The per-unit tax is added to (tax_sign=1) or removed from (tax_sign=-1) the net rate.
+    """
+    qty = abs(item.qty or 0)
+    unit_tax = (item.custom_tax_amount or 0) / qty if qty else 0
+    return qty, round(round(item.base_net_rate or 0, 4) + tax_sign * unit_tax, 4)
+
+
 def get_invoice_reference_number(invoice: Document) -> str:
     """
     Generate a unique reference number for the invoice submission.
@@ -192,10 +202,10 @@ def get_invoice_reference_number(invoice: Document) -> str:
     Returns:
         str: The generated reference number for submission.
     """
-    reference_number = invoice.name
-    if hasattr(invoice, "revision_count") and invoice.revision_count is not None and int(invoice.revision_count) > 0:
-        reference_number = f"{invoice.name}-REV{int(invoice.revision_count)}"
-    return reference_number
+    revision_count = int(getattr(invoice, "revision_count", 0) or 0)
+    if revision_count > 0:
+        return f"{invoice.name}-REV{revision_count}"
+    return invoice.name
 
 
     """ END OF SALES INVOICE PAYLOAD BUILDING AND TAX CALCULATION"""
@@ -213,9 +223,7 @@ def build_creditnote_payload(
     # get current datetime (server time)
     paymentType = "02" if invoice_type == "Sales Invoice" else "01"
     creditNoteReason = "11" if invoice_type == "Sales Invoice" else "06"
-    dt = now_datetime()
-    dateOnly = dt.strftime("%Y%m%d")
-    dateTime = f"{dateOnly}120000"
+    dateOnly, dateTime = get_submission_dates()
     payload = {
         "orgInvoiceNo": reference_number,
         "traderInvoiceNo": invoice.name,
@@ -237,23 +245,25 @@ def build_creditnote_payload(
     
     etims_log("Debug", "build_creditnote_payload payload reference_number", reference_number,payload)
     calculate_tax(invoice)
-    
-    for item in invoice.items:
-        tax_amount = item.get("custom_tax_amount", 0) or 0
-        qty = abs(item.get("qty"))
-        base_net_rate = round(item.get("base_net_rate") or 0, 4)
-        etims_log("Debug", "build_invoice_payload tax_code item", tax_amount,qty,base_net_rate,item)
-        payload["creditNoteItemsList"].append({
-            "itemCode": item.item_code,
-            "unitPrice": round(base_net_rate + ((tax_amount * -1) / qty if qty else 0), 4),
-            "quantity": qty,
-            "discountRate": 0,
-        })
+
+    payload["creditNoteItemsList"] = [_build_credit_note_item(item) for item in invoice.items]
+    etims_log("Debug", "build_creditnote_payload creditNoteItemsList", payload["creditNoteItemsList"])
 
     # etims_log("Debug", "build_invoice_payload payload", payload)
     return payload
 
 
+def _build_credit_note_item(item) -> dict:
+    """Build a creditNoteItemsList entry"""
+    qty, unit_price = _get_line_values(item, tax_sign=-1)
+    return {
+        "itemCode": item.item_code,
+        "unitPrice": unit_price,
+        "quantity": qty,
+        "discountRate": 0,
+    }
+
+
     """ END OF SALES CREDITNOTE PAYLOAD BUILDING AND TAX CALCULATION"""
 
 
@@ -268,15 +278,35 @@ def build_creditnote_payload(
 
 
 
+ETIMS_ACTIVE_CACHE_KEY = "etims_active"
+
+
+def is_etims_active() -> bool:
+    """Check whether any company has eTims switched on, cached until the settings change"""
+    return bool(
+        frappe.cache().get_value(
+            ETIMS_ACTIVE_CACHE_KEY,
+            generator=lambda: 1 if frappe.db.exists(SETTINGS_DOCTYPE_NAME, {"is_active": 1}) else 0,
+        )
+    )
+
+
+def clear_etims_active_cache() -> None:
+    """Forget the cached eTims active flag so the next check reads the settings again"""
+    frappe.cache().delete_value(ETIMS_ACTIVE_CACHE_KEY)
+
+
 def before_save_(doc: "Document", method: str | None = None) -> None:
     #checks if eTims is set to active
-    # if not frappe.db.exists(SETTINGS_DOCTYPE_NAME, {"is_active": 1}): 
-    #     return
-    
+    if not doc.get("items") or not is_etims_active():
+        return
+
     # etims_logger.error(doc)
     etims_log("Debug", "before_save_", doc)
 
-    calculate_tax(doc) 
+    # Items may have changed since the last calculation, so always recalculate on save
+    doc.flags.etims_tax_calculated = False
+    calculate_tax(doc)
 
 
 def calculate_tax(doc: "Document") -> None:
@@ -285,17 +315,48 @@ def calculate_tax(doc: "Document") -> None:
     - Item-level tax templates (if any item has one), or
     - Document-level taxes (if no items have tax templates)
     Then set taxation type codes for all items.
+
+    The result is remembered on the document's flags, so later calls for the
+    same document instance (e.g. before_submit and the payload builders) are no-ops.
+    The prefetched Item rows are kept in `doc.flags.etims_item_details` for reuse.
     """
+    if doc.flags.etims_tax_calculated:
+        return
+
     taxes = doc.get("taxes", [])
-    has_item_level_tax = any(item.item_tax_template for item in doc.items)
-    
+
+    # Single walk over the items to collect everything the passes below need
+    item_codes = set()
+    has_item_level_tax = False
+    for item in doc.items:
+        item_codes.add(item.item_code)
+        if item.item_tax_template:
+            has_item_level_tax = True
+
     etims_log("Debug", "has_item_level_tax", has_item_level_tax)
     if has_item_level_tax:
         _calculate_item_level_taxes(doc) #Calculate taxes using item tax templates
     elif taxes:
         _calculate_document_level_taxes(doc, taxes) #Distribute document-level taxes across items
-    
-    _set_taxation_type_codes(doc)
+
+    doc.flags.etims_item_details = get_etims_item_details(item_codes)
+    _set_taxation_type_codes(doc, doc.flags.etims_item_details)
+    doc.flags.etims_tax_calculated = True
+
+
+def get_etims_item_details(item_codes: set[str]) -> dict[str, dict]:
+    """Fetch the eTims item code and tax code of each Item using a single query"""
+    if not item_codes:
+        return {}
+
+    return {
+        row.name: row
+        for row in frappe.get_all(
+            "Item",
+            filters={"name": ["in", list(item_codes)]},
+            fields=["name", "custom_item_code_etims", "custom_eTims_tax_code"],
+        )
+    }
 
 
 
@@ -304,7 +365,7 @@ def _calculate_item_level_taxes(doc: "Document") -> None:
     for item in doc.items:
         tax_rate = get_item_tax_rate(item.item_tax_template) if item.item_tax_template else None
         tax_amount = item.base_net_amount * tax_rate / 100 if tax_rate else 0
-        
+
         etims_log("Debug", "_calculate_item_level_taxes", tax_amount)
         item.custom_tax_amount = tax_amount
         item.custom_tax_rate = tax_rate if tax_rate else 0
@@ -320,26 +381,31 @@ def _calculate_document_level_taxes(doc: "Document", taxes: list) -> None:
         return
     
     total_tax_amount = sum(tax.tax_amount for tax in taxes)
-    
+
     etims_log("Debug", "_calculate_document_level_taxes", total_tax_amount)
+    # Every item gets the same share of tax per unit of net amount, so the
+    # effective rate is constant across the document
+    tax_factor = total_tax_amount / total_net_amount
+    tax_rate = tax_factor * 100
     for item in doc.items:
-        item_ratio = item.base_net_amount / total_net_amount
-        item.custom_tax_amount = total_tax_amount * item_ratio
-        
-        if item.base_net_amount > 0:
-            item.custom_tax_rate = (item.custom_tax_amount / item.base_net_amount) * 100
-        else:
-            item.custom_tax_rate = 0
+        base_net_amount = item.base_net_amount
+        item.custom_tax_amount = base_net_amount * tax_factor
+        item.custom_tax_rate = tax_rate if base_net_amount > 0 else 0
 
 
+@request_cache
 def get_item_tax_rate(item_tax_template: str) -> float:
     """Return the sum of all tax rates in the given Item Tax Template"""
-    tax_template = frappe.get_doc("Item Tax Template", item_tax_template)
-    etims_log("Debug", "_calculaget_item_tax_ratete_item_level_taxes", tax_template)
-    return sum(tax.tax_rate for tax in tax_template.taxes) if tax_template.taxes else 0
+    tax_rates = frappe.get_all(
+        "Item Tax Template Detail",
+        filters={"parent": item_tax_template, "parenttype": "Item Tax Template"},
+        pluck="tax_rate",
+    )
+    etims_log("Debug", "get_item_tax_rate", item_tax_template, tax_rates)
+    return sum(tax_rates)
 
 
-def _set_taxation_type_codes(doc: "Document") -> None:
+def _set_taxation_type_codes(doc: "Document", etims_items: dict[str, dict]) -> None:
     """
     Determine taxation type code for each item using this priority:
     1. From item's tax template (if exists)
@@ -348,20 +414,19 @@ def _set_taxation_type_codes(doc: "Document") -> None:
     4. Default to B if none of the above apply
     """
     etims_log("Debug", "_set_taxation_type_codes doc", doc)
+
+    # Ensure items are eTims registered, once per item however many lines use it
+    unregistered = [item_code for item_code, row in etims_items.items() if not row.custom_item_code_etims]
+    if unregistered:
+        from .apis.apis import perform_item_registration
+        for item_code in unregistered:
+            perform_item_registration(item_code)
+
     for item in doc.items:
-        # Load the linked Item
-        item_doc = frappe.get_doc("Item", item.item_code)
-        etims_log("Debug", "_set_taxation_type_codes item_doc", item_doc.name)
-
-        # Ensure item is eTims registered
-        if not item_doc.custom_item_code_etims:
-            from .apis.apis import perform_item_registration
-            perform_item_registration(item_doc.name)
-        
         item.taxation_type_code = (
             # _get_taxation_type_from_template(item) or
             # _get_taxation_type_from_rate(item) or
-            _get_taxation_type_from_item(item) or
+            _get_taxation_type_from_item(item, etims_items) or
             "A" # fallback default
         )
         # item_doc = frappe.get_doc("Item",item.item_code )
@@ -376,9 +441,10 @@ def _set_taxation_type_codes(doc: "Document") -> None:
         #         print("Account Head:", tax.tax_type, " | Tax Rate:", tax.tax_rate)
 
 
-def _get_taxation_type_from_item(item) -> str:
-    """Get taxation type from item master data if available"""
-    return frappe.get_value("Item", item.item_code, "custom_eTims_tax_code") or ""
+def _get_taxation_type_from_item(item, etims_items: dict[str, dict]) -> str:
+    """Get taxation type from the prefetched item master data if available"""
+    row = etims_items.get(item.item_code)
+    return (row and row.custom_eTims_tax_code) or ""
 
 def _get_taxation_type_from_template(item) -> str:
     """Get taxation type from item's tax template if available"""
@@ -414,8 +480,5 @@ def get_etims_action_data(doctype: str, docname: str = None) -> dict[str, Any]:
     if not active_settings or active_settings.get("is_active") != 1:
         return
 
-    return active_settings
-
-
-
+    return {field: active_settings.get(field) for field in SETTINGS_FIELDS}
 